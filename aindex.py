@@ -7,14 +7,15 @@
 #
 #
 
-import colorsys
 import logging
 import os
 import sqlite3
 import sys
 
 from datetime import datetime, timedelta
+from urllib.parse import quote
 
+import matplotlib.colors as mcolors
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
@@ -22,91 +23,91 @@ import numpy as np
 import adapters
 
 from config import Config
+from tools import get_figure
 
 plt.style.use(['classic', 'fast'])
 
 NB_DAYS = 34
 
-WWV_REQUEST = """
-SELECT MAX(wwv.A), AVG(wwv.A), MIN(wwv.A), DATE(DATETIME(wwv.time, "unixepoch")) AS dt
-FROM wwv
-WHERE wwv.time > ?
-GROUP BY dt
-"""
+WWV_REQUEST = "SELECT wwv.time, wwv.A FROM wwv WHERE wwv.time > ? ORDER BY wwv.time"
 
 WWV_CONDITIONS = "SELECT conditions FROM wwv ORDER BY time DESC LIMIT 1"
 
-def color_complement(hue, saturation, value, alpha):
-  rgb = colorsys.hsv_to_rgb(hue, saturation, value)
-  c_rgb = [1.0 - c for c in rgb]
-  c_hsv = colorsys.rgb_to_hsv(*c_rgb)
-  return c_hsv + (alpha, )
+def complement_rgba(rgba):
+  """Complementary colors of an array of RGBA values, alpha is left untouched"""
+  rgba = np.asarray(rgba)
+  out = rgba.copy()
+  out[..., :3] = 1.0 - rgba[..., :3]
+  return out
 
 
+def connect_ro(db_name, **kwargs):
+  """Open the database read-only with the file memory mapped"""
+  conn = sqlite3.connect(f'file:{quote(db_name)}?mode=ro', uri=True, timeout=5, **kwargs)
+  conn.execute('PRAGMA mmap_size=268435456')
+  conn.execute('PRAGMA query_only=1')
+  return conn
+
 def get_conditions(db_name):
-  conn = sqlite3.connect(db_name, timeout=5,
-                         detect_types=sqlite3.PARSE_DECLTYPES)
+  conn = connect_ro(db_name, detect_types=sqlite3.PARSE_DECLTYPES)
   with conn:
     curs = conn.cursor()
     result = curs.execute(WWV_CONDITIONS).fetchone()
   return result[0]
 
 def get_wwv(db_name, days):
-  data = []
-  print(db_name)
-  print(days)
+  logger = logging.getLogger('aindex')
   start_date = datetime.utcnow() - timedelta(days=days)
-  print(start_date)
-  conn = sqlite3.connect(db_name, timeout=5,
-                         detect_types=sqlite3.PARSE_DECLTYPES)
-  conn.set_trace_callback(print)
+  # No detect_types, the time column is needed as raw epoch seconds
+  conn = connect_ro(db_name)
+  if logger.isEnabledFor(logging.DEBUG):
+    conn.set_trace_callback(logger.debug)
   with conn:
     curs = conn.cursor()
-    results = curs.execute(WWV_REQUEST, (start_date,))
-    for res in results:
-      dte = datetime.strptime(res[-1], '%Y-%m-%d')
-      data.append((dte, *res[:-1]))
-  return data
-
-def autolabel(ax, rects):
-  """Attach a text label above each bar displaying its height"""
-  for rect in rects:
-    height = rect.get_height()
-    color = rect.get_facecolor()
-    ax.text(rect.get_x() + rect.get_width() / 2., 1, f'{int(height)}',
-            color=color_complement(*color), fontsize="10", ha='center')
+    rows = np.array(curs.execute(WWV_REQUEST, (start_date,)).fetchall(),
+                    dtype=[('t', 'f8'), ('a', 'f8')])
+
+  if not rows.size:
+    return []
+  # Rows are sorted by time, each day starts where the day number changes
+  day = (rows['t'] // 86400).astype('i8')
+  edges = np.flatnonzero(np.diff(day, prepend=day[0] - 1))
+  amax = np.maximum.reduceat(rows['a'], edges)
+  amin = np.minimum.reduceat(rows['a'], edges)
+  aavg = np.add.reduceat(rows['a'], edges) / np.diff(edges, append=rows.size)
+  dates = day[edges].astype('datetime64[D]').astype('O')
+  return list(zip(dates, amax, aavg, amin))
 
 def graph(data, condition, filename):
 
-  datetm = np.array([d[0] for d in data])
-  amax = np.array([d[1] for d in data])
-  amin = np.array([d[3] for d in data])
-  aavg = np.array([d[2] for d in data])
-
-  colors = ['lightgreen'] * len(aavg)
-  for pos, val in enumerate(aavg):
-    if 20 < val < 30:
-      colors[pos] = 'darkorange'
-    elif 30 < val < 50:
-      colors[pos] = 'red'
-    elif 50 < val < 100:
-      colors[pos] = 'darkred'
-    elif val >= 100:
-      colors[pos] = 'darkmagenta'
+  dtype = [('d', 'O'), ('mx', 'f8'), ('av', 'f8'), ('mn', 'f8')]
+  arr = np.fromiter((tuple(d[:4]) for d in data), dtype=dtype, count=len(data))
+  datetm = arr['d']
+  amax = arr['mx']
+  aavg = arr['av']
+  amin = arr['mn']
+
+  # Buckets are open on the left (20 < val) except for the last one (val >= 100)
+  palette = np.array(['lightgreen', 'darkorange', 'red', 'darkred', 'darkmagenta'])
+  idx = np.digitize(aavg, [20, 30, 50], right=True) + (aavg >= 100)
+  colors = palette[idx].tolist()
 
   today = datetime.utcnow().strftime('%Y/%m/%d %H:%M UTC')
-  fig = plt.figure(figsize=(12, 5))
+  fig = get_figure(figsize=(12, 5))
   fig.suptitle('A-Index', fontsize=14, fontweight='bold')
   fig.text(0.01, 0.02, f'SunFluxBot By W6BSD {today}')
   fig.text(0.15, 0.8, "Forecast: " + condition, fontsize=12, zorder=4,
            bbox=dict(boxstyle='round', linewidth=1, facecolor='linen', alpha=1, pad=.8))
 
-  axgc = plt.gca()
+  axgc = fig.add_subplot()
   axgc.tick_params(labelsize=10)
-  bars = axgc.bar(datetm, aavg, linewidth=0.75, zorder=2, color=colors)
-  axgc.plot(datetm, amax, marker='v', linewidth=0, color="steelblue")
-  axgc.plot(datetm, amin, marker='^', linewidth=0, color="navy")
-  autolabel(axgc, bars)
+  bars = axgc.bar(datetm, aavg, linewidth=0.75, zorder=2, color=colors, rasterized=True)
+  axgc.plot(datetm, amax, marker='v', linewidth=0, color="steelblue", rasterized=True)
+  axgc.plot(datetm, amin, marker='^', linewidth=0, color="navy", rasterized=True)
+  labels = axgc.bar_label(bars, labels=[f'{int(v)}' for v in aavg], label_type='center',
+                          fontsize=10)
+  for label, color in zip(labels, complement_rgba(mcolors.to_rgba_array(colors))):
+    label.set_color(color)
 
   axgc.axhline(y=20, linewidth=1.5, zorder=1, color='green')
   axgc.axhline(y=30, linewidth=1.5, zorder=1, color='darkorange')
@@ -128,8 +129,7 @@ def graph(data, condition, filename):
               facecolor='linen', borderaxespad=1)
 
   fig.autofmt_xdate(rotation=10, ha="center")
-  plt.savefig(filename, transparent=False, dpi=100)
-  plt.close()
+  fig.savefig(filename, transparent=False, dpi=100)
   return filename
 
 def main():
@@ -76,7 +76,7 @@ class EISN:
   @staticmethod
   def write_cache(cache_file, data):
     with open(cache_file, 'wb') as cfd:
-      pickle.dump(data, cfd)
+      pickle.dump(data, cfd, protocol=pickle.HIGHEST_PROTOCOL)
 
   @staticmethod
   def is_expired(cache_file, cache_time):
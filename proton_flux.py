@@ -7,28 +7,29 @@
 #
 #
 
+import gzip
 import json
 import logging
-import math
 import os
-import pickle
 import re
 import sys
 import time
 import urllib.request
+import zipfile
 
 from datetime import datetime
+from email.utils import formatdate
+from urllib.error import HTTPError
 
 import warnings
 
 import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import numpy as np
 
 from matplotlib import ticker
 
 from config import Config
-from tools import noaa_date_hook
+from tools import get_figure
 from tools import remove_outliers
 
 # Older versions of numpy are too verbose when arrays contain np.nan values
@@ -38,11 +39,16 @@ warnings.filterwarnings('ignore')
 NOAA_URL = 'https://services.swpc.noaa.gov/json/goes/primary/integral-protons-3-day.json'
 WARNING_THRESHOLD = 10**2
 
+# Energy channels (MeV) published by NOAA and their column in the flux array
+ENERGIES = (1, 5, 10, 30, 50, 60, 100, 500)
+ENERGY_IDX = {energy: col for col, energy in enumerate(ENERGIES)}
+
 class ProtonFlux:
   def __init__(self, cache_file, cache_time=900):
     self.log = logging.getLogger('ProtonFlux')
     self.cachefile = cache_file
-    self.data = None
+    self._data = None
+    self._data_loaded = False
     self.log.debug('Import Proton Flux')
     now = time.time()
     try:
@@ -50,59 +56,86 @@ class ProtonFlux:
       if now - filest.st_mtime > cache_time:
         raise FileNotFoundError
     except FileNotFoundError:
-      self.download()
-      self.writecache()
-    else:
-      self.readcache()
+      if self.download():
+        self.writecache()
 
-  def download(self):
+  @property
+  def data(self):
+    """The cache is only read the first time the data is accessed"""
+    if not self._data_loaded:
+      self.readcache()
+      if self._data is None:
+        self.download(if_modified=False)
+        self.writecache()
+    return self._data
+
+  @data.setter
+  def data(self, value):
+    self._data = value
+    self._data_loaded = True
+
+  def download(self, if_modified=True):
+    """Fetch the data from NOAA, return False if the cache is still current"""
     self.log.info('Downloading data from NOAA')
     _re = re.compile(r'>=(\d+)\sMeV')
 
-    def get_e(field):
-      if match := _re.match(field):
-        return match.group(1)
-      return None
-
-    with urllib.request.urlopen(NOAA_URL) as res:
-      webdata = res.read()
-      encoding = res.info().get_content_charset('utf-8')
-      _data = json.loads(webdata.decode(encoding), object_hook=noaa_date_hook)
-
-    data = {}
+    headers = {'Accept-Encoding': 'gzip'}
+    if if_modified and os.path.exists(self.cachefile):
+      headers['If-Modified-Since'] = formatdate(os.path.getmtime(self.cachefile), usegmt=True)
+    request = urllib.request.Request(NOAA_URL, headers=headers)
+    try:
+      with urllib.request.urlopen(request) as res:
+        webdata = res.read()
+        if res.info().get('Content-Encoding') == 'gzip':
+          webdata = gzip.decompress(webdata)
+        encoding = res.info().get_content_charset('utf-8')
+        _data = json.loads(webdata.decode(encoding))
+    except HTTPError as err:
+      if err.code != 304:
+        raise
+      self.log.info('Data not modified, reusing cache "%s"', self.cachefile)
+      os.utime(self.cachefile, None)
+      return False
+
+    # Only a handful of distinct energy labels, parse each one once
+    energies = {e: int(_re.match(e).group(1)) for e in {elem['energy'] for elem in _data}}
+    # ISO-8601 time tags sort chronologically as strings
+    times = sorted({elem['time_tag'] for elem in _data})
+    time_idx = {t: i for i, t in enumerate(times)}
+    flux = np.zeros((len(times), len(ENERGIES)), dtype='f4')
     for elem in _data:
-      data[elem['time_tag']] = {k: 0.0 for k in (1, 10, 100, 30, 5, 50, 500, 60)}
-
-    for elem in _data:
-      date = elem['time_tag']
-      energy = int(get_e(elem['energy']))
-      data[date][energy] = elem['flux']
-    self.data = data
+      flux[time_idx[elem['time_tag']], ENERGY_IDX[energies[elem['energy']]]] = elem['flux']
+    # numpy parses the UTC tags natively once the 'Z' suffix is dropped
+    dates = np.array([t.rstrip('Z') for t in times], dtype='datetime64[s]')
+    self.data = {'time': dates, 'flux': flux}
+    return True
 
   def readcache(self):
     """Read data from the cache"""
     self.log.debug('Read from cache "%s"', self.cachefile)
     try:
-      with open(self.cachefile, 'rb') as fd_cache:
-        data = pickle.load(fd_cache)
-    except (FileNotFoundError, EOFError):
-      data = None
+      with np.load(self.cachefile) as cache:
+        data = {'time': cache['time'].astype('datetime64[s]'), 'flux': cache['flux']}
+    except (FileNotFoundError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+      data = None   # Missing, truncated or older (pickle) cache format
     self.data = data
 
   def writecache(self):
     """Write data into the cachefile"""
     self.log.debug('Write cache "%s"', self.cachefile)
-    with open(self.cachefile, 'wb') as fd_cache:
-      pickle.dump(self.data, fd_cache)
+    cache_tmp = self.cachefile + '.tmp'
+    with open(cache_tmp, 'wb') as fd_cache:
+      np.savez(fd_cache, time=self.data['time'].astype('i8'), flux=self.data['flux'])
+    os.replace(cache_tmp, self.cachefile)
 
   def graph(self, imagename):
     energy = (10, 30, 50, 100)  # Graphs to plot
     colors = {10: "tab:orange", 30: "tab:olive", 50: "tab:blue", 100: "tab:cyan"}
-    fig = plt.figure(figsize=(12, 5))
+    fig = get_figure(figsize=(12, 5))
     fig.subplots_adjust(bottom=0.15)
 
     fig.suptitle('Proton Flux', fontsize=14, fontweight='bold')
-    ax = plt.gca()
+    ax = fig.add_subplot()
     ax.set_yscale("log")
     ax.tick_params(axis='x', which='both', labelsize=12, rotation=10)
 
@@ -114,17 +147,18 @@ class ProtonFlux:
     ax.xaxis.set_major_locator(mdates.HourLocator(interval=12))
     ax.xaxis.set_minor_locator(mdates.HourLocator())
 
-    dates  = np.array(list(self.data.keys()))
+    dates = self.data['time']
+
+    fluxes = self.data['flux'][:, [ENERGY_IDX[e] for e in energy]]
+    for column in fluxes.T:
+      remove_outliers(column)
 
-    _max = 0
-    for _energy in energy:
-      data = np.array([flux[_energy] for flux in self.data.values()])
-      data = remove_outliers(data)
-      ax.plot(dates, data, linewidth=1.25, color=colors[_energy], zorder=2,
-              label=f'>={_energy} MeV')
-      _max = max(data.max(), _max)
+    lines = ax.plot(dates, fluxes, linewidth=1.25, zorder=2, rasterized=True)
+    for line, _energy in zip(lines, energy):
+      line.set_color(colors[_energy])
+      line.set_label(f'>={_energy} MeV')
 
-    magnitude = 1 + int(math.log(_max, 10))
+    magnitude = 1 + int(np.log10(np.nanmax(fluxes)))
     ax.set_ylim((0.1, 10**magnitude))
 
     if magnitude > WARNING_THRESHOLD:
@@ -140,9 +174,8 @@ class ProtonFlux:
         line.set_linewidth(2)
 
     today = datetime.utcnow().strftime('%Y/%m/%d %H:%M UTC')
-    plt.figtext(0.01, 0.02, f'SunFluxBot By W6BSD {today}', fontsize=12)
+    fig.text(0.01, 0.02, f'SunFluxBot By W6BSD {today}', fontsize=12)
     fig.savefig(imagename, transparent=False, dpi=100)
-    plt.close()
     self.log.info('Saved "%s"', imagename)
 
 
@@ -157,7 +190,7 @@ def main():
   except IndexError:
     name = '/tmp/proton_flux.png'
 
-  cache_file = config.get('protonflux.cache_file', '/tmp/proton_flux.pkl')
+  cache_file = config.get('protonflux.cache_file', '/tmp/proton_flux.npz')
   cache_time = config.get('protonflux.cache_time', 900)
   p_f = ProtonFlux(cache_file, cache_time)
   if not p_f.graph(name):
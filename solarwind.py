@@ -80,7 +80,7 @@ class SolarWind:
     """Write data into the cachefile"""
     self.log.debug('Write cache "%s"', self.cachefile)
     with open(self.cachefile, 'wb') as fd_cache:
-      pickle.dump(self.data, fd_cache)
+      pickle.dump(self.data, fd_cache, protocol=pickle.HIGHEST_PROTOCOL)
 
   @staticmethod
   def float(num):
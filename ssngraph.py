@@ -86,7 +86,7 @@ class SSN:
   @staticmethod
   def write_cache(cache_file, data):
     with open(cache_file, 'wb') as cfd:
-      pickle.dump(data, cfd)
+      pickle.dump(data, cfd, protocol=pickle.HIGHEST_PROTOCOL)
 
   @staticmethod
   def is_expired(cache_file, cache_time):
@@ -209,7 +209,7 @@ def readcache(cachefile):
 def writecache(cachefile, data):
   """Write data into the cachefile"""
   with open(cachefile, 'wb') as fd_cache:
-    pickle.dump(data, fd_cache)
+    pickle.dump(data, fd_cache, protocol=pickle.HIGHEST_PROTOCOL)
 
 def error_callback(update, context):
   logger.warning('error_callback - Update "%s" error "%s"',
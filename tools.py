@@ -7,17 +7,26 @@
 #
 #
 
+import matplotlib.pyplot as plt
 import numpy as np
 
 from datetime import datetime
 
+_FIGURES = {}
+
+def get_figure(figsize=(12, 5)):
+  """Return a cleared figure, reusing the one created by a previous call"""
+  fig = _FIGURES.get(figsize)
+  if fig is None:
+    fig = _FIGURES[figsize] = plt.figure(figsize=figsize)
+  else:
+    fig.clf(keep_observers=True)
+  return fig
+
 def remove_outliers(points, low=25, high=95):
-  percent_lo = np.percentile(points, low, interpolation='midpoint')
-  percent_hi= np.percentile(points, high, interpolation='midpoint')
+  percent_lo, percent_hi = np.percentile(points, [low, high], method='midpoint')
   iqr = percent_hi - percent_lo
-  lower_bound = points <= (percent_lo - 5 * iqr)
-  upper_bound = points >= (percent_hi + 5 * iqr)
-  points[lower_bound | upper_bound] = np.nan
+  np.putmask(points, (points <= percent_lo - 5 * iqr) | (points >= percent_hi + 5 * iqr), np.nan)
   return points
 
 def noaa_date(field):
@@ -39,16 +39,6 @@ NOAA_XRAY = 'https://services.swpc.noaa.gov/json/goes/primary/xrays-3-day.json'
 NOAA_FLARE = 'https://services.swpc.noaa.gov/json/goes/primary/xray-flares-7-day.json'
 
 
-def remove_outlier(points, low=25, high=95):
-  percent_lo = np.percentile(points, low, interpolation='midpoint')
-  percent_hi= np.percentile(points, high, interpolation='midpoint')
-  iqr = percent_hi - percent_lo
-  lower_bound = points <= (percent_lo - 5 * iqr)
-  upper_bound = points >= (percent_hi + 5 * iqr)
-  points[lower_bound | upper_bound] = np.nan
-  return points
-
-
 class XRayFlux:
   def __init__(self, cache_file, cache_time=900):
     self.log = logging.getLogger("XRayFlux")
@@ -96,13 +86,13 @@ class XRayFlux:
     """Write data into the cachefile"""
     self.log.debug('Write cache "%s"', self.cachefile)
     with open(self.cachefile, 'wb') as fd_cache:
-      pickle.dump(self.xray_data, fd_cache)
-      pickle.dump(self.flare_data, fd_cache)
+      pickle.dump(self.xray_data, fd_cache, protocol=pickle.HIGHEST_PROTOCOL)
+      pickle.dump(self.flare_data, fd_cache, protocol=pickle.HIGHEST_PROTOCOL)
 
   def graph(self, imagename):
     dates  = np.array(list(self.xray_data.keys()))
     data = np.array([d['flux'] for d in self.xray_data.values()])
-    data = remove_outlier(data)
+    data = remove_outliers(data)
     data[data < 10**-7] = np.nan
 
     fig = plt.figure(figsize=(12, 5))